@@ -120,6 +120,17 @@ class MarketDataManager {
       }
     });
 
+    // The MT5 server batches price updates into one { symbol: data } frame per interval,
+    // broadcast to every streaming client, so keep only the symbols this job subscribed to
+    this.socket.on('market-data-batch', (batch) => {
+      if (!batch || typeof batch !== 'object') return;
+      for (const [symbol, data] of Object.entries(batch)) {
+        if (data && this.subscribedSymbols.has(symbol)) {
+          marketDataCache.set(symbol, data);
+        }
+      }
+    });
+
     this.socket.on('connect_error', (error) => {
       console.error('📊 Market data connection error:', error);
       this.attemptReconnect();
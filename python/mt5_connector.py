@@ -1,470 +1,724 @@
+import eventlet
+eventlet.monkey_patch()
+from eventlet import tpool
+
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_socketio import SocketIO, emit, disconnect
 import MetaTrader5 as mt5
+import hmac
+import os
 import sys
 import time
 import threading
 from datetime import datetime
+from operator import attrgetter
 import logging
-from queue import Queue
-import asyncio
+from logging.handlers import RotatingFileHandler
+import orjson
 
-# Configure logging
+# Configure logging; set MT5_LOG_FILE in production to log to a rotating file instead of stdout
+LOG_FILE = os.environ.get('MT5_LOG_FILE')
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get('MT5_LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s [%(levelname)s] %(message)s',
     handlers=[
-        logging.StreamHandler(sys.stdout)
+        RotatingFileHandler(LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5) if LOG_FILE
+        else logging.StreamHandler(sys.stdout)
     ]
 )
 logger = logging.getLogger(__name__)
 
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class OrjsonSocketIOJSON:
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = 'aurify@123'
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', engineio_logger=False)
+# Encoded once for the constant-time comparison in handle_connect
+_SECRET = app.config['SECRET_KEY'].encode()
+# MT5_SOCKETIO_SERIALIZER=msgpack sends binary packets (clients then need socket.io-msgpack-parser);
+# the default stays orjson-encoded text packets for existing clients
+SOCKETIO_SERIALIZER = os.environ.get('MT5_SOCKETIO_SERIALIZER', 'default')
+# Optional pub/sub backend (e.g. redis://localhost:6379/0) so several server processes share rooms
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('MT5_SOCKETIO_MESSAGE_QUEUE') or None
+# WebSocket-only: clients connect with transports: ['websocket'], so there is no long-polling handshake
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', engineio_logger=False,
+                    json=OrjsonSocketIOJSON, serializer=SOCKETIO_SERIALIZER,
+                    transports=['websocket'], allow_upgrades=False,
+                    message_queue=SOCKETIO_MESSAGE_QUEUE)
+
+# Room every streaming client joins; price updates for all symbols are broadcast
+# here as one batched frame and clients filter by the symbols they requested
+MARKET_ROOM = 'market'
+
+# Hot MT5 constants bound once so the trade paths skip the module attribute lookups
+_POSITION_TYPE_BUY = mt5.POSITION_TYPE_BUY
+_ORDER_TYPE_BUY = mt5.ORDER_TYPE_BUY
+_ORDER_TYPE_SELL = mt5.ORDER_TYPE_SELL
+_TRADE_ACTION_DEAL = mt5.TRADE_ACTION_DEAL
+_ORDER_TIME_GTC = mt5.ORDER_TIME_GTC
+_RETCODE_DONE = mt5.TRADE_RETCODE_DONE
+
+# Pulls every field get_positions reports out of a TradePosition in one C-level call
+_position_fields = attrgetter(
+    'ticket', 'symbol', 'type', 'volume', 'price_open', 'price_current',
+    'sl', 'tp', 'profit', 'time', 'comment', 'magic'
+)
+
+# SymbolInfo.filling_mode bit -> order filling type, in order of preference (FOK, IOC, RETURN)
+_FILLING_FLAGS = (
+    (1, mt5.ORDER_FILLING_FOK),
+    (2, mt5.ORDER_FILLING_IOC),
+    (4, mt5.ORDER_FILLING_RETURN)
+)
+
+_POSITION_TYPE_STR = {mt5.POSITION_TYPE_BUY: "BUY", mt5.POSITION_TYPE_SELL: "SELL"}
+
+# filling_mode & 0b111 -> names of the supported filling types, built once for the 8 bit patterns
+_FILL_MODE_TABLE = tuple(
+    tuple(name for flag, name in ((1, 'FOK'), (2, 'IOC'), (4, 'RETURN')) if bits & flag)
+    for bits in range(8)
+)
+
+_ERROR_CODES = {
+    10018: "Market closed",
+    10019: "Insufficient funds",
+    10020: "Prices changed",
+    10021: "Invalid request (check volume, symbol, or market status)",
+    10022: "Invalid SL/TP",
+    10017: "Invalid parameters",
+    10027: "AutoTrading disabled",
+    10030: "Invalid order filling type"
+}
+
+_iso_cache = {}
+
+def _iso(ts):
+    # Tick and position times have one-second resolution, so the same strings repeat constantly
+    iso = _iso_cache.get(ts)
+    if iso is None:
+        if len(_iso_cache) >= 256:
+            _iso_cache.clear()
+        t = time.localtime(ts)
+        iso = _iso_cache[ts] = f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
+    return iso
+
+def _open_session(server, login, password):
+    # Runs on the MT5 worker so initialize, login and account_info execute as one uninterrupted sequence
+    if not mt5.initialize():
+        return False, None, None
+    if not mt5.login(login, password=password, server=server):
+        return True, mt5.last_error(), None
+    return True, None, mt5.account_info()
+
+def _fetch_quotes(symbols):
+    # Runs on the MT5 worker thread. One symbols_get call returns SymbolInfo records for the
+    # whole sweep, which carry bid/ask/time like a tick; only symbols missing from it, or
+    # without a quote yet, fall back to their own symbol_info_tick call.
+    infos = mt5.symbols_get(group=",".join(symbols)) or ()
+    by_name = {info.name: info for info in infos if info.time}
+    return [by_name.get(symbol) or mt5.symbol_info_tick(symbol) for symbol in symbols]
+
+# All MT5 calls run on one native tpool thread: it serializes terminal access
+# and keeps blocking IPC off the eventlet hub
+tpool.set_num_threads(1)
 
 class MT5Connector:
     def __init__(self):
         self.connected = False
         self.active_subscriptions = {}
-        self.price_threads = {}
+        self._poller = None
+        self._poller_lock = threading.Lock()
+        # Green lock: connect/disconnect yield on the MT5 worker and must not interleave
+        self._session_lock = threading.Lock()
         self.symbol_data = {}
-        self.mt5_lock = threading.Lock()
-        self.data_queue = Queue()
+        self._selected = set()
+        self._info_cache = {}
+        self._symbols_cache = (0.0, None)
+        self._positions_cache = (0.0, None)
+        self.positions_ttl = 0.1
+        self._last_price = {}
+        self._rates_cache = {}
+        self.rates_refresh_interval = 60.0
+        self._latest = {}
+        self._latest_lock = threading.Lock()
         self.batch_interval = 0.1
+        self.significant_move = 0.001
+        self._flush_event = threading.Event()
+        self.max_poll_interval = 1.0
+        self.closed_poll_interval = 5.0
+        self.poller_retry_delay = 1.0
+        self.backoff_after_unchanged = 10
         self.shutdown_event = threading.Event()
+        self.aggregator_thread = threading.Thread(target=self._aggregate_market_data, daemon=True, name="MarketDataAggregator")
+        self.aggregator_thread.start()
+
+    def _aggregate_market_data(self):
+        while True:
+            # Flush every batch_interval, or straight away when the poller flags a significant move
+            self._flush_event.wait(self.batch_interval)
+            self._flush_event.clear()
+            with self._latest_lock:
+                batch, self._latest = self._latest, {}
+            if batch:
+                try:
+                    socketio.emit('market-data-batch', batch, room=MARKET_ROOM)
+                except Exception as e:
+                    logger.exception("Error emitting market data batch: %s", e)
 
     def connect(self, server, login, password):
-        try:
-            with self.mt5_lock:
-                if not mt5.initialize():
+        with self._session_lock:
+            try:
+                initialized, error, account_info = self._mt5(_open_session, server, login, password)
+                if not initialized:
                     logger.error("MT5 initialization failed")
                     return False, {"code": 1000, "message": "MT5 initialization failed"}
                 
-                authorized = mt5.login(login, password=password, server=server)
-                if not authorized:
-                    error = mt5.last_error()
-                    logger.error(f"Login failed: {error}")
+                if error:
+                    logger.error("Login failed: %s", error)
                     return False, {"code": error[0], "message": f"Login failed: {error[1]}"}
                 
                 self.connected = True
                 self.shutdown_event.clear()
-                account_info = mt5.account_info()
                 if account_info and not account_info.trade_expert:
                     logger.warning("AutoTrading disabled")
                     return False, {"code": 1001, "message": "AutoTrading disabled. Enable 'Algo Trading' in MT5"}
-                
-                logger.info(f"Connected to MT5, account: {account_info.login if account_info else None}")
+
+                logger.info("Connected to MT5, account: %s", account_info.login if account_info else None)
                 return True, {"message": "Connected", "account": account_info.login if account_info else None}
-        except Exception as e:
-            logger.exception(f"Connection error: {str(e)}")
-            return False, {"code": 1002, "message": str(e)}
+            except Exception as e:
+                logger.exception("Connection error: %s", e)
+                return False, {"code": 1002, "message": str(e)}
 
     def disconnect(self):
-        try:
-            with self.mt5_lock:
+        with self._session_lock:
+            try:
                 self.connected = False
                 self.shutdown_event.set()
+                self.active_subscriptions.clear()
+                self._selected.clear()
+                self._info_cache.clear()
+                self._symbols_cache = (0.0, None)
+                self._positions_cache = (0.0, None)
+                self._last_price.clear()
+                self._rates_cache.clear()
                 
-                for symbol in list(self.price_threads.keys()):
-                    self.stop_price_stream(symbol)
-                
-                for thread in list(self.price_threads.values()):
-                    if thread.is_alive():
-                        thread.join(timeout=2)
+                poller = self._poller
+                if poller is not None and poller.is_alive():
+                    poller.join(timeout=2)
                 
-                self.active_subscriptions.clear()
-                self.price_threads.clear()
-                mt5.shutdown()
+                self._mt5(mt5.shutdown)
                 logger.info("Disconnected from MT5")
                 return True, {"message": "Disconnected"}
-        except Exception as e:
-            logger.exception(f"Disconnect error: {str(e)}")
-            return False, {"code": 1003, "message": str(e)}
+            except Exception as e:
+                logger.exception("Disconnect error: %s", e)
+                return False, {"code": 1003, "message": str(e)}
+
+    def _mt5(self, fn, *args, **kwargs):
+        return tpool.execute(fn, *args, **kwargs)
+
+    def _mt5_with_error(self, fn, *args, **kwargs):
+        # Read last_error in the same worker hop so another call cannot overwrite it
+        def call():
+            result = fn(*args, **kwargs)
+            return result, (mt5.last_error() if not result else None)
+        return tpool.execute(call)
+
+    def _ensure_selected(self, symbol):
+        if symbol in self._selected:
+            return True
+        if not self._mt5(mt5.symbol_select, symbol, True):
+            return False
+        self._selected.add(symbol)
+        return True
+
+    def _symbol_info_cached(self, symbol, ttl=30.0):
+        cached = self._info_cache.get(symbol)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        info = self._mt5(mt5.symbol_info, symbol)
+        if info:
+            fillings = tuple(mode for flag, mode in _FILLING_FLAGS if info.filling_mode & flag)
+            self._info_cache[symbol] = (time.monotonic(), info, fillings)
+        return info
+
+    def _supported_fillings(self, symbol, info):
+        # Computed alongside the SymbolInfo it belongs to when the cache entry is filled
+        cached = self._info_cache.get(symbol)
+        if cached and cached[1] is info:
+            return cached[2]
+        return tuple(mode for flag, mode in _FILLING_FLAGS if info.filling_mode & flag)
 
-    def get_symbols(self):
+    def get_symbols(self, group=None, ttl=60.0):
         try:
             if not self.connected:
                 logger.warning("Attempted to get symbols while not connected")
                 return False, {"code": 1004, "message": "Not connected"}
             
-            with self.mt5_lock:
-                symbols = mt5.symbols_get() or []
+            if group:
+                # Group filters come straight from the query string, so only the full listing is cached
+                symbols = self._mt5(mt5.symbols_get, group=group) or []
                 return True, [symbol.name for symbol in symbols]
+            cached_at, cached = self._symbols_cache
+            if cached is not None and time.monotonic() - cached_at < ttl:
+                return True, cached
+            names = [symbol.name for symbol in self._mt5(mt5.symbols_get) or []]
+            self._symbols_cache = (time.monotonic(), names)
+            return True, names
         except Exception as e:
-            logger.exception(f"Error getting symbols: {str(e)}")
+            logger.exception("Error getting symbols: %s", e)
             return False, {"code": 1005, "message": str(e)}
 
     def get_symbol_info(self, symbol):
         try:
             if not self.connected:
-                logger.warning(f"Attempted to get symbol info for {symbol} while not connected")
+                logger.warning("Attempted to get symbol info for %s while not connected", symbol)
                 return False, {"code": 1004, "message": "Not connected"}
             
-            with self.mt5_lock:
-                if not mt5.symbol_select(symbol, True):
-                    logger.error(f"Symbol {symbol} not selected")
-                    return False, {"code": 1006, "message": f"Symbol {symbol} not selected"}
-                
-                info = mt5.symbol_info(symbol)
-                if not info:
-                    logger.error(f"Symbol {symbol} not found")
-                    return False, {"code": 1007, "message": f"Symbol {symbol} not found"}
-                
-                stops_level = getattr(info, 'stops_level', 0)
-                return True, {
-                    "name": info.name,
-                    "point": info.point,
-                    "digits": info.digits,
-                    "spread": info.spread,
-                    "trade_mode": info.trade_mode,
-                    "volume_min": info.volume_min,
-                    "volume_max": info.volume_max,
-                    "volume_step": info.volume_step,
-                    "stops_level": stops_level,
-                    "filling_mode": info.filling_mode
-                }
+            if not self._ensure_selected(symbol):
+                logger.error("Symbol %s not selected", symbol)
+                return False, {"code": 1006, "message": f"Symbol {symbol} not selected"}
+            
+            info = self._symbol_info_cached(symbol)
+            if not info:
+                logger.error("Symbol %s not found", symbol)
+                return False, {"code": 1007, "message": f"Symbol {symbol} not found"}
+            
+            stops_level = getattr(info, 'stops_level', 0)
+            # Static fields come from the cache; the spread is taken from a live tick
+            tick = self._mt5(mt5.symbol_info_tick, symbol)
+            spread = round((tick.ask - tick.bid) / info.point) if tick and info.point > 0 else info.spread
+            return True, {
+                "name": info.name,
+                "point": info.point,
+                "digits": info.digits,
+                "spread": spread,
+                "trade_mode": info.trade_mode,
+                "volume_min": info.volume_min,
+                "volume_max": info.volume_max,
+                "volume_step": info.volume_step,
+                "stops_level": stops_level,
+                "filling_mode": info.filling_mode
+            }
         except Exception as e:
-            logger.exception(f"Error getting symbol info for {symbol}: {str(e)}")
+            logger.exception("Error getting symbol info for %s: %s", symbol, e)
             return False, {"code": 1008, "message": str(e)}
 
     def get_price(self, symbol):
         try:
             if not self.connected:
-                logger.warning(f"Attempted to get price for {symbol} while not connected")
+                logger.warning("Attempted to get price for %s while not connected", symbol)
                 return False, {"code": 1004, "message": "Not connected"}
             
-            with self.mt5_lock:
-                if not mt5.symbol_select(symbol, True):
-                    logger.error(f"Symbol {symbol} not selected")
-                    return False, {"code": 1006, "message": f"Symbol {symbol} not selected"}
-                
-                time.sleep(0.05)
-                tick = mt5.symbol_info_tick(symbol)
-                
-                if not tick:
-                    rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 0, 1)
-                    if not rates or not len(rates):
-                        logger.error(f"No price data for {symbol}")
-                        return False, {"code": 1009, "message": f"No price data for {symbol}"}
-                    
-                    rate = rates[0]
-                    return True, {
-                        "symbol": symbol,
-                        "bid": rate['close'],
-                        "ask": rate['close'],
-                        "spread": 0,
-                        "time": datetime.fromtimestamp(rate['time']).isoformat(),
-                        "timestamp": time.time(),
-                        "high": rate['high'],
-                        "low": rate['low'],
-                        "marketStatus": "CLOSED"
-                    }
-                
-                symbol_info = mt5.symbol_info(symbol)
-                spread = (tick.ask - tick.bid) / symbol_info.point if symbol_info and symbol_info.point > 0 else 0
-                
-                current_data = self.symbol_data.get(symbol, {"high": None, "low": None, "last_close": None, "last_timestamp": None})
-                current_high = current_data["high"] or tick.bid
-                current_low = current_data["low"] or tick.bid
-                current_high = max(current_high, tick.bid, tick.ask)
-                current_low = min(current_low, tick.bid, tick.ask)
-                
-                self.symbol_data[symbol] = {
-                    "high": current_high,
-                    "low": current_low,
-                    "last_close": tick.bid if symbol_info and symbol_info.trade_mode == 0 else current_data.get("last_close"),
-                    "last_timestamp": datetime.fromtimestamp(tick.time).isoformat()
-                }
-                
-                return True, {
-                    "symbol": symbol,
-                    "bid": tick.bid,
-                    "ask": tick.ask,
-                    "spread": spread,
-                    "time": datetime.fromtimestamp(tick.time).isoformat(),
-                    "timestamp": time.time(),
-                    "high": current_high,
-                    "low": current_low,
-                    "marketStatus": "TRADEABLE" if symbol_info and symbol_info.trade_mode != 0 else "CLOSED"
-                }
+            if not self._ensure_selected(symbol):
+                logger.error("Symbol %s not selected", symbol)
+                return False, {"code": 1006, "message": f"Symbol {symbol} not selected"}
+            
+            tick = self._mt5(mt5.symbol_info_tick, symbol)
+            
+            if not tick:
+                # No quote (market closed): serve the last good price rather than hitting the rates history
+                last = self._last_price.get(symbol)
+                if last is not None:
+                    return True, {**last, "marketStatus": "CLOSED", "stale": True}
+                return self._price_from_rates(symbol)
+            
+            return True, self._price_from_tick(symbol, tick)
         except Exception as e:
-            logger.exception(f"Error getting price for {symbol}: {str(e)}")
+            logger.exception("Error getting price for %s: %s", symbol, e)
             return False, {"code": 1010, "message": str(e)}
 
+    def get_prices(self, symbols):
+        try:
+            if not self.connected:
+                logger.warning("Attempted to get prices while not connected")
+                return False, {"code": 1004, "message": "Not connected"}
+            
+            # Symbols that cannot be selected or priced are reported per symbol instead of failing the batch
+            errors = {}
+            selected = []
+            for symbol in symbols:
+                if self._ensure_selected(symbol):
+                    selected.append(symbol)
+                else:
+                    errors[symbol] = {"code": 1006, "message": f"Symbol {symbol} not selected"}
+            # One worker hop and one bulk quote query for the whole batch
+            ticks = self._mt5(_fetch_quotes, selected) if selected else []
+            prices = {}
+            for symbol, tick in zip(selected, ticks):
+                if tick:
+                    prices[symbol] = self._price_from_tick(symbol, tick)
+                else:
+                    success, price = self.get_price(symbol)
+                    if success:
+                        prices[symbol] = price
+                    else:
+                        errors[symbol] = price
+            return True, (prices, errors)
+        except Exception as e:
+            logger.exception("Error getting prices for %s: %s", symbols, e)
+            return False, {"code": 1015, "message": str(e)}
+
+    def _price_from_rates(self, symbol):
+        # copy_rates_from_pos is a history query, so a result is reused for rates_refresh_interval.
+        # Misses are not cached: history is often still loading right after symbol_select.
+        now = time.monotonic()
+        cached = self._rates_cache.get(symbol)
+        if cached is not None and now - cached[0] < self.rates_refresh_interval:
+            return True, cached[1]
+        rates = self._mt5(mt5.copy_rates_from_pos, symbol, mt5.TIMEFRAME_M1, 0, 1)
+        if rates is None or not len(rates):
+            logger.error("No price data for %s", symbol)
+            return False, {"code": 1009, "message": f"No price data for {symbol}"}
+        rate = rates[0]
+        price = {
+            "symbol": symbol,
+            "bid": rate['close'],
+            "ask": rate['close'],
+            "spread": 0,
+            "time": _iso(int(rate['time'])),
+            "high": rate['high'],
+            "low": rate['low'],
+            "marketStatus": "CLOSED",
+            "stale": True
+        }
+        self._rates_cache[symbol] = (now, price)
+        return True, price
+
+    def _price_from_tick(self, symbol, tick):
+        symbol_info = self._symbol_info_cached(symbol)
+        spread = (tick.ask - tick.bid) / symbol_info.point if symbol_info and symbol_info.point > 0 else 0
+        iso_time = _iso(tick.time)
+        
+        bid, ask = tick.bid, tick.ask
+        hi, lo = (ask, bid) if ask > bid else (bid, ask)
+        # Per-symbol state is updated in place rather than rebuilt on every tick
+        state = self.symbol_data.get(symbol)
+        if state is None:
+            state = self.symbol_data[symbol] = {"high": hi, "low": lo, "last_close": None, "last_timestamp": None}
+        if hi > state["high"]:
+            state["high"] = hi
+        if lo < state["low"]:
+            state["low"] = lo
+        if symbol_info and symbol_info.trade_mode == 0:
+            state["last_close"] = bid
+        state["last_timestamp"] = iso_time
+        
+        price = self._last_price[symbol] = {
+            "symbol": symbol,
+            "bid": tick.bid,
+            "ask": tick.ask,
+            "spread": spread,
+            "time": iso_time,
+            "high": state["high"],
+            "low": state["low"],
+            "marketStatus": "TRADEABLE" if symbol_info and symbol_info.trade_mode != 0 else "CLOSED"
+        }
+        return price
+
     def start_price_stream(self, symbol, client_id):
-        if symbol in self.price_threads:
-            if client_id not in self.active_subscriptions.get(symbol, []):
-                self.active_subscriptions.setdefault(symbol, []).append(client_id)
-            return
+        subscribers = self.active_subscriptions.setdefault(symbol, set())
+        # A resubscribe from a flapping client skips the add and the log, but still
+        # revives the poller in case it is no longer running
+        new_subscription = client_id not in subscribers
+        if new_subscription:
+            subscribers.add(client_id)
         
-        self.active_subscriptions[symbol] = [client_id]
+        with self._poller_lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_prices, daemon=True, name="PricePoller")
+                self._poller.start()
+        if new_subscription:
+            logger.info("Started price stream for %s with client %s", symbol, client_id)
+
+    def _poll_prices(self):
+        last_prices = {}
+        error_counts = {}
+        max_errors = 5
+        # Per-symbol adaptive polling: back off while the price is flat, snap back on a move
+        poll_intervals = {}
+        next_polls = {}
+        unchanged_counts = {}
         
-        def price_worker():
-            last_price = None
-            error_count = 0
-            max_errors = 5
+        while True:
+            with self._poller_lock:
+                if not self.active_subscriptions or not self.connected or self.shutdown_event.is_set():
+                    self._poller = None
+                    break
             
-            while symbol in self.price_threads and self.connected and not self.shutdown_event.is_set():
+            try:
+                now = time.monotonic()
+                symbols = []
+                for symbol in [s for s in list(self.active_subscriptions) if next_polls.get(s, 0) <= now]:
+                    try:
+                        selected = self._ensure_selected(symbol)
+                        if not selected:
+                            logger.error("Symbol %s not selected", symbol)
+                    except Exception as e:
+                        selected = False
+                        logger.exception("Error selecting %s: %s", symbol, e)
+                    if not selected:
+                        # A bad symbol only counts against itself and sits out this sweep; unselectable
+                        # names (e.g. "*" or "!X") must never reach the symbols_get group pattern
+                        error_counts[symbol] = error_counts.get(symbol, 0) + 1
+                        next_polls[symbol] = now + poll_intervals.get(symbol, self.batch_interval)
+                        if error_counts[symbol] >= max_errors:
+                            logger.error("Too many errors for %s, stopping stream", symbol)
+                            self.stop_price_stream(symbol)
+                        continue
+                    symbols.append(symbol)
                 try:
-                    success, price_data = self.get_price(symbol)
-                    if success:
-                        current_price = f"{price_data['bid']}-{price_data['ask']}"
-                        if current_price != last_price:
-                            socketio.emit('market-data', price_data, room=f'symbol_{symbol}')
-                            last_price = current_price
-                            error_count = 0
-                    else:
-                        error_count += 1
-                        logger.error(f"Failed to get price for {symbol}: {price_data.get('message', 'Unknown error')}")
-                        if error_count >= max_errors:
-                            logger.error(f"Too many errors for {symbol}, stopping stream")
-                            break
-                    
-                    time.sleep(self.batch_interval)
+                    # One hop and one bulk MT5 call for the whole sweep instead of one per symbol
+                    ticks = self._mt5(_fetch_quotes, symbols) if symbols else []
                 except Exception as e:
-                    error_count += 1
-                    logger.exception(f"Error streaming {symbol}: {str(e)}")
-                    if error_count >= max_errors:
-                        logger.error(f"Too many errors for {symbol}, stopping stream")
-                        break
-            if symbol in self.price_threads:
-                del self.price_threads[symbol]
-            if symbol in self.active_subscriptions:
-                del self.active_subscriptions[symbol]
-            logger.info(f"Price stream ended for {symbol}")
-        
-        thread = threading.Thread(target=price_worker, daemon=True, name=f"PriceStream-{symbol}")
-        self.price_threads[symbol] = thread
-        thread.start()
-        logger.info(f"Started price stream for {symbol} with client {client_id}")
+                    logger.exception("Error fetching ticks: %s", e)
+                    ticks = [None] * len(symbols)
+                
+                for symbol, tick in zip(symbols, ticks):
+                    interval = poll_intervals.get(symbol, self.batch_interval)
+                    try:
+                        if tick:
+                            success, price_data = True, self._price_from_tick(symbol, tick)
+                        else:
+                            success, price_data = self.get_price(symbol)
+                        if success:
+                            current_price = (price_data['bid'], price_data['ask'])
+                            previous = last_prices.get(symbol)
+                            if current_price != previous:
+                                with self._latest_lock:
+                                    self._latest[symbol] = price_data
+                                if previous and abs(current_price[0] - previous[0]) >= previous[0] * self.significant_move:
+                                    self._flush_event.set()
+                                last_prices[symbol] = current_price
+                                unchanged_counts[symbol] = 0
+                                interval = self.batch_interval
+                            else:
+                                unchanged_counts[symbol] = unchanged_counts.get(symbol, 0) + 1
+                                if unchanged_counts[symbol] >= self.backoff_after_unchanged:
+                                    interval = min(interval * 2, self.max_poll_interval)
+                            if price_data['marketStatus'] == "CLOSED":
+                                interval = self.closed_poll_interval
+                            error_counts[symbol] = 0
+                        else:
+                            error_counts[symbol] = error_counts.get(symbol, 0) + 1
+                            logger.error("Failed to get price for %s: %s", symbol, price_data.get('message', 'Unknown error'))
+                    except Exception as e:
+                        error_counts[symbol] = error_counts.get(symbol, 0) + 1
+                        logger.exception("Error streaming %s: %s", symbol, e)
+                    
+                    poll_intervals[symbol] = interval
+                    next_polls[symbol] = now + interval
+                    
+                    if error_counts.get(symbol, 0) >= max_errors:
+                        logger.error("Too many errors for %s, stopping stream", symbol)
+                        self.stop_price_stream(symbol)
+                
+                # Forget symbols that were unsubscribed so a resubscribe gets a fresh update
+                for symbol in [s for s in next_polls if s not in self.active_subscriptions]:
+                    for state in (last_prices, error_counts, poll_intervals, next_polls, unchanged_counts):
+                        state.pop(symbol, None)
+            except Exception as e:
+                # Keep serving the remaining subscribers: back off and run the next sweep
+                logger.exception("Price poller sweep failed: %s", e)
+                socketio.sleep(self.poller_retry_delay)
+                continue
+            
+            socketio.sleep(self.batch_interval)
+        logger.info("Price poller stopped")
 
     def stop_price_stream(self, symbol, client_id=None):
         try:
             if symbol not in self.active_subscriptions:
                 return
             if client_id:
-                if client_id in self.active_subscriptions[symbol]:
-                    self.active_subscriptions[symbol].remove(client_id)
-                if not self.active_subscriptions[symbol]:
+                subscribers = self.active_subscriptions[symbol]
+                subscribers.discard(client_id)
+                if not subscribers:
                     del self.active_subscriptions[symbol]
-                    if symbol in self.price_threads:
-                        del self.price_threads[symbol]
-                    logger.info(f"Stopped price stream for {symbol} (client {client_id})")
+                    logger.info("Stopped price stream for %s (client %s)", symbol, client_id)
             else:
-                if symbol in self.active_subscriptions:
-                    del self.active_subscriptions[symbol]
-                if symbol in self.price_threads:
-                    del self.price_threads[symbol]
-                logger.info(f"Stopped price stream for {symbol} (all clients)")
+                del self.active_subscriptions[symbol]
+                logger.info("Stopped price stream for %s (all clients)", symbol)
         except Exception as e:
-            logger.exception(f"Error stopping price stream for {symbol}: {str(e)}")
+            logger.exception("Error stopping price stream for %s: %s", symbol, e)
 
     def place_trade(self, symbol, volume, order_type, sl_distance=None, tp_distance=None, comment="", magic=0):
         try:
             if not self.connected:
                 return False, "Not connected"
-            with self.mt5_lock:
-                if not mt5.symbol_select(symbol, True):
-                    return False, f"Symbol {symbol} not selected"
-                info = mt5.symbol_info(symbol)
-                if not info:
-                    return False, f"Symbol {symbol} not found"
-                if info.trade_mode == 0:
-                    return False, f"Symbol {symbol} not tradable"
-                stop_level = getattr(info, 'stops_level', 0) * info.point
-                tick = mt5.symbol_info_tick(symbol)
-                if not tick:
-                    return False, f"No price for {symbol}"
-                order_type = order_type.upper()
-                if order_type == "BUY":
-                    mt5_type = mt5.ORDER_TYPE_BUY
-                    price = tick.ask
-                    sl = round(price - sl_distance, info.digits) if sl_distance and sl_distance > 0 else 0
-                    tp = round(price + tp_distance, info.digits) if tp_distance and tp_distance > 0 else 0
-                elif order_type == "SELL":
-                    mt5_type = mt5.ORDER_TYPE_SELL
-                    price = tick.bid
-                    sl = round(price + sl_distance, info.digits) if sl_distance and sl_distance > 0 else 0
-                    tp = round(price - tp_distance, info.digits) if tp_distance and tp_distance > 0 else 0
+            if not self._ensure_selected(symbol):
+                return False, f"Symbol {symbol} not selected"
+            info = self._symbol_info_cached(symbol)
+            if not info:
+                return False, f"Symbol {symbol} not found"
+            if info.trade_mode == 0:
+                return False, f"Symbol {symbol} not tradable"
+            stop_level = getattr(info, 'stops_level', 0) * info.point
+            tick = self._mt5(mt5.symbol_info_tick, symbol)
+            if not tick:
+                return False, f"No price for {symbol}"
+            order_type = order_type.upper()
+            if order_type == "BUY":
+                mt5_type, price, direction = _ORDER_TYPE_BUY, tick.ask, 1
+            elif order_type == "SELL":
+                mt5_type, price, direction = _ORDER_TYPE_SELL, tick.bid, -1
+            else:
+                return False, f"Invalid order type {order_type}"
+            # Distances are raised to the broker stop level up front so each level is rounded once
+            digits = info.digits
+            sl = round(price - direction * max(sl_distance, stop_level), digits) if sl_distance and sl_distance > 0 else 0
+            tp = round(price + direction * max(tp_distance, stop_level), digits) if tp_distance and tp_distance > 0 else 0
+            volume = max(info.volume_min, min(info.volume_max, round(volume / info.volume_step) * info.volume_step))
+
+            # Determine the appropriate filling type
+            supported_fillings = self._supported_fillings(symbol, info)
+
+            if not supported_fillings:
+                logger.error("No supported filling modes for %s", symbol)
+                return False, f"No supported filling modes for {symbol}"
+
+            # Prefer FOK, then IOC, then RETURN
+            filling_type = supported_fillings[0]  # Take the first supported filling mode
+            logger.debug("Selected filling type: %s for symbol %s", filling_type, symbol)
+
+            request = {
+                "action": _TRADE_ACTION_DEAL,
+                "symbol": symbol,
+                "volume": volume,
+                "type": mt5_type,
+                "price": price,
+                "deviation": 20,
+                "magic": magic,
+                "comment": comment,
+                "type_time": _ORDER_TIME_GTC,
+                "type_filling": filling_type
+            }
+            if sl:
+                request["sl"] = sl
+            if tp:
+                request["tp"] = tp
+            result, error = self._mt5_with_error(mt5.order_send, request)
+            if result is None:
+                error_code = error[0] if isinstance(error, tuple) else getattr(error, 'code', -1)
+                error_comment = error[1] if isinstance(error, tuple) else getattr(error, 'comment', 'Unknown error')
+                if error_code == 10013:  # Requote, try with higher deviation
+                    request["deviation"] = 50
+                    result, error = self._mt5_with_error(mt5.order_send, request)
+                    if result is None:
+                        error_code = error[0] if isinstance(error, tuple) else getattr(error, 'code', -1)
+                        error_comment = error[1] if isinstance(error, tuple) else getattr(error, 'comment', 'Unknown error')
+                        return False, f"Order failed: Code: {error_code} - {error_comment}"
                 else:
-                    return False, f"Invalid order type {order_type}"
-                volume = max(info.volume_min, min(info.volume_max, round(volume / info.volume_step) * info.volume_step))
-
-                # Determine the appropriate filling type
-                filling_mode = info.filling_mode
-                supported_fillings = []
-                if filling_mode & 1:  # FOK
-                    supported_fillings.append(mt5.ORDER_FILLING_FOK)
-                if filling_mode & 2:  # IOC
-                    supported_fillings.append(mt5.ORDER_FILLING_IOC)
-                if filling_mode & 4:  # RETURN
-                    supported_fillings.append(mt5.ORDER_FILLING_RETURN)
-
-                if not supported_fillings:
-                    logger.error(f"No supported filling modes for {symbol}")
-                    return False, f"No supported filling modes for {symbol}"
-
-                # Prefer FOK, then IOC, then RETURN
-                filling_type = supported_fillings[0]  # Take the first supported filling mode
-                logger.info("Selected filling type: {filling_type} for symbol {symbol}")
-
-                request = {
-                    "action": mt5.TRADE_ACTION_DEAL,
-                    "symbol": symbol,
-                    "volume": volume,
-                    "type": mt5_type,
-                    "price": price,
-                    "deviation": 20,
-                    "magic": magic,
+                    return False, f"Order failed: Code: {error_code} - {error_comment}"
+            if result.retcode == _RETCODE_DONE:
+                self._positions_cache = (0.0, None)
+                return True, {
+                    "order": result.order,
+                    "deal": result.deal,
+                    "volume": result.volume,
+                    "price": result.price,
+                    "sl": sl,
+                    "tp": tp,
                     "comment": comment,
-                    "type_time": mt5.ORDER_TIME_GTC,
-                    "type_filling": filling_type
-                }
-                if sl_distance and sl_distance > 0 and sl != 0:
-                    if sl_distance < stop_level:
-                        sl_distance = stop_level
-                        sl = round(price - sl_distance if order_type == "BUY" else price + sl_distance, info.digits)
-                    request["sl"] = sl
-                if tp_distance and tp_distance > 0 and tp != 0:
-                    if tp_distance < stop_level:
-                        tp_distance = stop_level
-                        tp = round(price + tp_distance if order_type == "BUY" else price - tp_distance, info.digits)
-                    request["tp"] = tp
-                result = mt5.order_send(request)
-                if result is None:
-                    error = mt5.last_error()
-                    error_code = error[0] if isinstance(error, tuple) else getattr(error, 'code', -1)
-                    error_comment = error[1] if isinstance(error, tuple) else getattr(error, 'comment', 'Unknown error')
-                    if error_code == 10013:  # Requote, try with higher deviation
-                        request["deviation"] = 50
-                        result = mt5.order_send(request)
-                        if result is None:
-                            error = mt5.last_error()
-                            error_code = error[0] if isinstance(error, tuple) else getattr(error, 'code', -1)
-                            error_comment = error[1] if isinstance(error, tuple) else getattr(error, 'comment', 'Unknown error')
-                            return False, f"Order failed: Code: {error_code} - {error_comment}"
-                    else:
-                        return False, f"Order failed: Code: {error_code} - {error_comment}"
-                if result.retcode == mt5.TRADE_RETCODE_DONE:
-                    return True, {
-                        "order": result.order,
-                        "deal": result.deal,
-                        "volume": result.volume,
-                        "price": result.price,
-                        "sl": sl,
-                        "tp": tp,
-                        "comment": comment,
-                        "retcode": result.retcode
-                    }
-                error_codes = {
-                    10018: "Market closed",
-                    10019: "Insufficient funds",
-                    10020: "Prices changed",
-                    10021: "Invalid request (check volume, symbol, or market status)",
-                    10022: "Invalid SL/TP",
-                    10017: "Invalid parameters",
-                    10027: "AutoTrading disabled",
-                    10030: "Invalid order filling type"
+                    "retcode": result.retcode
                 }
-                error_msg = error_codes.get(result.retcode, f"Error {result.retcode}")
-                return False, f"Order failed: {error_msg}"
+            error_msg = _ERROR_CODES.get(result.retcode, f"Error {result.retcode}")
+            return False, f"Order failed: {error_msg}"
         except Exception as e:
-            logger.exception(f"Error placing trade: {str(e)}")
+            logger.exception("Error placing trade: %s", e)
             return False, str(e)
 
     def close_trade(self, ticket, volume=None, symbol=None, max_retries=3):
         try:
             if not self.connected:
                 return False, "Not connected"
-            with self.mt5_lock:
-                position = mt5.positions_get(ticket=ticket)
-                if not position:
-                    return False, f"Position {ticket} not found"
-                pos = position[0]
-                symbol = symbol or pos.symbol
-                position_type = "BUY" if pos.type == mt5.POSITION_TYPE_BUY else "SELL"
-                close_type = mt5.ORDER_TYPE_SELL if pos.type == mt5.POSITION_TYPE_BUY else mt5.ORDER_TYPE_BUY
-                if volume is None:
-                    volume = pos.volume
-                else:
-                    volume = min(volume, pos.volume)
-                if not mt5.symbol_select(symbol, True):
-                    return False, f"Symbol {symbol} not selected"
-                info = mt5.symbol_info(symbol)
-                if not info:
-                    return False, f"Symbol {symbol} not found"
-                if info.trade_mode == 0:
-                    return False, f"Symbol {symbol} not tradable"
-                volume = max(info.volume_min, min(info.volume_max, round(volume / info.volume_step) * info.volume_step))
-                if volume < info.volume_min:
-                    return False, f"Volume {volume} below minimum {info.volume_min}"
-                if volume > info.volume_max:
-                    return False, f"Volume {volume} exceeds maximum {info.volume_max}"
-                filling_mode = info.filling_mode
-                supported_fillings = []
-                if filling_mode & 1:
-                    supported_fillings.append(mt5.ORDER_FILLING_FOK)
-                if filling_mode & 2:
-                    supported_fillings.append(mt5.ORDER_FILLING_IOC)
-                if filling_mode & 4:
-                    supported_fillings.append(mt5.ORDER_FILLING_RETURN)
-                if not supported_fillings:
-                    logger.error(f"No supported filling modes for {symbol}")
-                    return False, f"No supported filling modes for {symbol}"
-                filling_type = supported_fillings[0]  # First supported
-                for attempt in range(max_retries):
-                    tick = mt5.symbol_info_tick(symbol)
-                    if not tick:
-                        return False, f"No price for {symbol}"
-                    price = tick.bid if pos.type == mt5.POSITION_TYPE_BUY else tick.ask
-                    request = {
-                        "action": mt5.TRADE_ACTION_DEAL,
+            position = self._mt5(mt5.positions_get, ticket=ticket)
+            if not position:
+                return False, f"Position {ticket} not found"
+            pos = position[0]
+            symbol = symbol or pos.symbol
+            position_type = _POSITION_TYPE_STR.get(pos.type, "SELL")
+            close_type = _ORDER_TYPE_SELL if pos.type == _POSITION_TYPE_BUY else _ORDER_TYPE_BUY
+            if volume is None:
+                volume = pos.volume
+            else:
+                volume = min(volume, pos.volume)
+            if not self._ensure_selected(symbol):
+                return False, f"Symbol {symbol} not selected"
+            info = self._symbol_info_cached(symbol)
+            if not info:
+                return False, f"Symbol {symbol} not found"
+            if info.trade_mode == 0:
+                return False, f"Symbol {symbol} not tradable"
+            volume = max(info.volume_min, min(info.volume_max, round(volume / info.volume_step) * info.volume_step))
+            if volume < info.volume_min:
+                return False, f"Volume {volume} below minimum {info.volume_min}"
+            if volume > info.volume_max:
+                return False, f"Volume {volume} exceeds maximum {info.volume_max}"
+            supported_fillings = self._supported_fillings(symbol, info)
+            if not supported_fillings:
+                logger.error("No supported filling modes for %s", symbol)
+                return False, f"No supported filling modes for {symbol}"
+            filling_type = supported_fillings[0]  # First supported
+            # Built once; each attempt only refreshes the price, deviation and filling type
+            request = {
+                "action": _TRADE_ACTION_DEAL,
+                "symbol": symbol,
+                "volume": volume,
+                "type": close_type,
+                "position": ticket,
+                "price": None,
+                "magic": pos.magic,
+                "comment": f"Close {ticket}",
+                "type_filling": filling_type,
+                "deviation": 20
+            }
+            for attempt in range(max_retries):
+                tick = self._mt5(mt5.symbol_info_tick, symbol)
+                if not tick:
+                    return False, f"No price for {symbol}"
+                request["price"] = tick.bid if pos.type == _POSITION_TYPE_BUY else tick.ask
+                request["type_filling"] = filling_type
+                request["deviation"] = 20 + attempt * 10
+                result, error = self._mt5_with_error(mt5.order_send, request)
+                if result is None:
+                    error_code = error[0] if isinstance(error, tuple) else getattr(error, 'code', -1)
+                    error_comment = error[1] if isinstance(error, tuple) else getattr(error, 'comment', 'Unknown error')
+                    return False, f"Close failed: Code: {error_code} - {error_comment}"
+                if result.retcode == _RETCODE_DONE:
+                    self._positions_cache = (0.0, None)
+                    return True, {
+                        "deal": result.deal,
+                        "retcode": result.retcode,
+                        "price": result.price,
+                        "volume": result.volume,
+                        "profit": pos.profit,
                         "symbol": symbol,
-                        "volume": volume,
-                        "type": close_type,
-                        "position": ticket,
-                        "price": price,
-                        "magic": pos.magic,
-                        "comment": f"Close {ticket}",
-                        "type_filling": filling_type,
-                        "deviation": 20 + attempt * 10
-                    }
-                    result = mt5.order_send(request)
-                    if result is None:
-                        error = mt5.last_error()
-                        error_code = error[0] if isinstance(error, tuple) else getattr(error, 'code', -1)
-                        error_comment = error[1] if isinstance(error, tuple) else getattr(error, 'comment', 'Unknown error')
-                        return False, f"Close failed: Code: {error_code} - {error_comment}"
-                    if result.retcode == mt5.TRADE_RETCODE_DONE:
-                        return True, {
-                            "deal": result.deal,
-                            "retcode": result.retcode,
-                            "price": result.price,
-                            "volume": result.volume,
-                            "profit": pos.profit,
-                            "symbol": symbol,
-                            "position_type": position_type
-                        }
-                    if result.retcode == 10021 and attempt < max_retries - 1:
-                        filling_type = supported_fillings[1] if len(supported_fillings) > 1 else filling_type
-                        time.sleep(0.5)
-                        continue
-                    error_codes = {
-                        10018: "Market closed",
-                        10019: "Insufficient funds",
-                        10020: "Prices changed",
-                        10021: "Invalid request (check volume, symbol, or market status)",
-                        10022: "Invalid SL/TP",
-                        10017: "Invalid parameters",
-                        10027: "AutoTrading disabled",
-                        10030: "Invalid order filling type"
+                        "position_type": position_type
                     }
-                    error_msg = error_codes.get(result.retcode, f"Error {result.retcode}")
-                    return False, f"Close failed: {error_msg}"
-                return False, f"Close failed after {max_retries} attempts"
+                if result.retcode == 10021 and attempt < max_retries - 1:
+                    filling_type = supported_fillings[1] if len(supported_fillings) > 1 else filling_type
+                    socketio.sleep(0.5)
+                    continue
+                error_msg = _ERROR_CODES.get(result.retcode, f"Error {result.retcode}")
+                return False, f"Close failed: {error_msg}"
+            return False, f"Close failed after {max_retries} attempts"
         except Exception as e:
-            logger.exception(f"Error closing trade: {str(e)}")
+            logger.exception("Error closing trade: %s", e)
             return False, str(e)
 
     def get_positions(self):
@@ -472,34 +726,30 @@ class MT5Connector:
             if not self.connected:
                 logger.warning("Attempted to get positions while not connected")
                 return False, {"code": 1004, "message": "Not connected"}
-            with self.mt5_lock:
-                positions = mt5.positions_get()
-                if not positions:
-                    return True, []
-                result = []
-                for pos in positions:
-                    try:
-                        result.append({
-                            "ticket": pos.ticket,
-                            "symbol": pos.symbol,
-                            "type": "BUY" if pos.type == mt5.POSITION_TYPE_BUY else "SELL",
-                            "volume": pos.volume,
-                            "price_open": pos.price_open,
-                            "price_current": pos.price_current,
-                            "sl": pos.sl,
-                            "tp": pos.tp,
-                            "profit": pos.profit,
-                            "time": datetime.fromtimestamp(pos.time).isoformat(),
-                            "comment": pos.comment,
-                            "magic": pos.magic
-                        })
-                    except Exception as e:
-                        logger.error(f"Error processing position {pos.ticket}: {str(e)}")
-                        continue
-                logger.info(f"Retrieved {len(result)} open positions")
-                return True, result
+            cached_at, cached = self._positions_cache
+            if cached is not None and time.monotonic() - cached_at < self.positions_ttl:
+                return True, cached
+            positions = self._mt5(mt5.positions_get) or ()
+            result = [{
+                "ticket": ticket,
+                "symbol": symbol,
+                "type": _POSITION_TYPE_STR.get(position_type, "SELL"),
+                "volume": volume,
+                "price_open": price_open,
+                "price_current": price_current,
+                "sl": sl,
+                "tp": tp,
+                "profit": profit,
+                "time": _iso(opened),
+                "comment": comment,
+                "magic": magic
+            } for (ticket, symbol, position_type, volume, price_open, price_current,
+                   sl, tp, profit, opened, comment, magic) in map(_position_fields, positions)]
+            logger.debug("Retrieved %d open positions", len(result))
+            self._positions_cache = (time.monotonic(), result)
+            return True, result
         except Exception as e:
-            logger.exception(f"Error getting positions: {str(e)}")
+            logger.exception("Error getting positions: %s", e)
             return False, {"code": 1014, "message": str(e)}
 
 # Global connector instance
@@ -510,56 +760,57 @@ connector = MT5Connector()
 def handle_connect():
     client_id = request.sid
     secret = request.args.get('secret')
-    if secret != app.config['SECRET_KEY']:
-        logger.warning(f"Authentication failed for client {client_id}")
+    if not secret or not hmac.compare_digest(secret.encode(), _SECRET):
+        logger.warning("Authentication failed for client %s", client_id)
         emit('error', {'code': 2000, 'message': 'Authentication failed'})
         disconnect()
         return False
-    logger.info(f"Client connected: {client_id}")
+    logger.info("Client connected: %s", client_id)
     emit('connected', {'message': 'Connected to MT5 WebSocket server'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     client_id = request.sid
-    logger.info(f"Client disconnected: {client_id}")
+    logger.info("Client disconnected: %s", client_id)
     for symbol in list(connector.active_subscriptions.keys()):
         connector.stop_price_stream(symbol, client_id)
 
 @socketio.on('connect_error')
 def handle_connect_error(error):
-    logger.error(f"Connection error: {str(error)}")
+    logger.error("Connection error: %s", error)
     emit('error', {'code': 2001, 'message': f'Connection error: {str(error)}'})
 
 @socketio.on('request-data')
 def handle_request_data(symbols):
     client_id = request.sid
-    logger.info(f"Client {client_id} requesting data for symbols: {symbols}")
+    logger.info("Client %s requesting data for symbols: %s", client_id, symbols)
     if not connector.connected:
-        logger.warning(f"Client {client_id} requested data while MT5 not connected")
+        logger.warning("Client %s requested data while MT5 not connected", client_id)
         emit('error', {'code': 2002, 'message': 'MT5 not connected'})
         return
     if not isinstance(symbols, list):
         symbols = [symbols] if symbols else []
+    socketio.server.enter_room(client_id, MARKET_ROOM)
     for symbol in symbols:
         try:
-            socketio.server.enter_room(client_id, f'symbol_{symbol}')
             connector.start_price_stream(symbol, client_id)
         except Exception as e:
-            logger.error(f"Error starting stream for {symbol}: {str(e)}")
+            logger.error("Error starting stream for %s: %s", symbol, e)
             emit('error', {'code': 2003, 'message': f'Error starting stream for {symbol}: {str(e)}'})
 
 @socketio.on('stop-data')
 def handle_stop_data(symbols):
     client_id = request.sid
-    logger.info(f"Client {client_id} stopping data for symbols: {symbols}")
+    logger.info("Client %s stopping data for symbols: %s", client_id, symbols)
     if not isinstance(symbols, list):
         symbols = [symbols] if symbols else []
     for symbol in symbols:
         try:
-            socketio.server.leave_room(client_id, f'symbol_{symbol}')
             connector.stop_price_stream(symbol, client_id)
         except Exception as e:
-            logger.error(f"Error stopping stream for {symbol}: {str(e)}")
+            logger.error("Error stopping stream for %s: %s", symbol, e)
+    if not any(client_id in subscribers for subscribers in connector.active_subscriptions.values()):
+        socketio.server.leave_room(client_id, MARKET_ROOM)
 
 # REST API Endpoints
 @app.route('/connect', methods=['POST'])
@@ -581,7 +832,7 @@ def connect():
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in connect endpoint: {str(e)}")
+        logger.exception("Error in connect endpoint: %s", e)
         return jsonify({"success": False, "error": {"code": 3002, "message": str(e)}}), 500
 
 @app.route('/disconnect', methods=['POST'])
@@ -593,19 +844,19 @@ def disconnect_endpoint():
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in disconnect endpoint: {str(e)}")
+        logger.exception("Error in disconnect endpoint: %s", e)
         return jsonify({"success": False, "error": {"code": 3003, "message": str(e)}}), 500
 
 @app.route('/symbols', methods=['GET'])
 def get_symbols():
     try:
-        success, result = connector.get_symbols()
+        success, result = connector.get_symbols(request.args.get('group'))
         if success:
             return jsonify({"success": True, "data": result})
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in symbols endpoint: {str(e)}")
+        logger.exception("Error in symbols endpoint: %s", e)
         return jsonify({"success": False, "error": {"code": 3004, "message": str(e)}}), 500
 
 @app.route('/symbol_info/<symbol>', methods=['GET'])
@@ -618,7 +869,7 @@ def get_symbol_info(symbol):
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in symbol_info endpoint for {symbol}: {str(e)}")
+        logger.exception("Error in symbol_info endpoint for %s: %s", symbol, e)
         return jsonify({"success": False, "error": {"code": 3005, "message": str(e)}}), 500
 
 @app.route('/price/<symbol>', methods=['GET'])
@@ -630,9 +881,25 @@ def get_price(symbol):
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in price endpoint for {symbol}: {str(e)}")
+        logger.exception("Error in price endpoint for %s: %s", symbol, e)
         return jsonify({"success": False, "error": {"code": 3006, "message": str(e)}}), 500
 
+@app.route('/symbols_batch', methods=['GET'])
+def get_symbols_batch():
+    try:
+        symbols = [symbol for symbol in request.args.get('symbols', '').split(',') if symbol]
+        if not symbols:
+            return jsonify({"success": False, "error": {"code": 3015, "message": "Missing symbols"}}), 400
+        success, result = connector.get_prices(symbols)
+        if success:
+            prices, errors = result
+            return jsonify({"success": True, "data": prices, "errors": errors})
+        else:
+            return jsonify({"success": False, "error": result}), 400
+    except Exception as e:
+        logger.exception("Error in symbols_batch endpoint: %s", e)
+        return jsonify({"success": False, "error": {"code": 3014, "message": str(e)}}), 500
+
 @app.route('/trade', methods=['POST'])
 def trade():
     try:
@@ -656,7 +923,7 @@ def trade():
     except ValueError as e:
         return jsonify({"success": False, "error": f"Invalid numeric value: {str(e)}"}), 400
     except Exception as e:
-        logger.exception(f"Error in trade endpoint: {str(e)}")
+        logger.exception("Error in trade endpoint: %s", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/close', methods=['POST'])
@@ -681,7 +948,7 @@ def close():
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in close endpoint: {str(e)}")
+        logger.exception("Error in close endpoint: %s", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/positions', methods=['GET'])
@@ -693,7 +960,7 @@ def get_positions():
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in positions endpoint: {str(e)}")
+        logger.exception("Error in positions endpoint: %s", e)
         return jsonify({"success": False, "error": {"code": 3013, "message": str(e)}}), 500
 
 @app.route('/symbol_filling/<symbol>', methods=['GET'])
@@ -702,13 +969,7 @@ def get_symbol_filling(symbol):
         success, result = connector.get_symbol_info(symbol)
         if success:
             filling_mode = result.get('filling_mode', 0)
-            supported_fillings = []
-            if filling_mode & 1:
-                supported_fillings.append('FOK')
-            if filling_mode & 2:
-                supported_fillings.append('IOC')
-            if filling_mode & 4:
-                supported_fillings.append('RETURN')
+            supported_fillings = _FILL_MODE_TABLE[filling_mode & 0b111]
             return jsonify({
                 "success": True,
                 "data": {
@@ -720,24 +981,27 @@ def get_symbol_filling(symbol):
         else:
             return jsonify({"success": False, "error": result}), 400
     except Exception as e:
-        logger.exception(f"Error in symbol_filling endpoint for {symbol}: {str(e)}")
+        logger.exception("Error in symbol_filling endpoint for %s: %s", symbol, e)
         return jsonify({"success": False, "error": {"code": 3007, "message": str(e)}}), 500
 
 @app.route('/health', methods=['GET'])
 def health():
     try:
+        poller = connector._poller
+        poller_alive = poller is not None and poller.is_alive()
         return jsonify({
             "success": True,
             "data": {
                 "status": "running",
                 "connected": connector.connected,
                 "active_subscriptions": list(connector.active_subscriptions.keys()),
-                "active_threads": len([t for t in connector.price_threads.values() if t.is_alive()]),
+                "active_threads": 1 if poller_alive else 0,
+                "poller_running": poller_alive,
                 "timestamp": datetime.now().isoformat()
             }
         })
     except Exception as e:
-        logger.exception(f"Error in health endpoint: {str(e)}")
+        logger.exception("Error in health endpoint: %s", e)
         return jsonify({"success": False, "error": {"code": 3012, "message": str(e)}}), 500
 
 @app.errorhandler(404)
@@ -746,7 +1010,7 @@ def not_found(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.exception(f"Internal server error: {str(error)}")
+    logger.exception("Internal server error: %s", error)
     return jsonify({"success": False, "error": {"code": 500, "message": "Internal server error"}}), 500
 
 if __name__ == '__main__':
@@ -757,6 +1021,6 @@ if __name__ == '__main__':
         logger.info("Server shutdown requested...")
         connector.disconnect()
     except Exception as e:
-        logger.exception(f"Failed to start server: {str(e)}")
+        logger.exception("Failed to start server: %s", e)
     finally:
         logger.info("Server stopped.")
\ No newline at end of file
@@ -24,6 +24,7 @@ class MarketDataService {
     this.reconnectAttempts = 0;
     this.reconnectDelay = CONFIG.RECONNECT_BASE_DELAY;
     this.pendingSymbolRequests = new Set(["GOLD"]); // Always request GOLD by default
+    this.requestedSymbols = new Set(); // Symbols to keep from the shared batch stream
 
     // Initialize with backup values
     this.initializeBackupData();
@@ -112,6 +113,7 @@ class MarketDataService {
     });
 
     this.socket.on("market-data", this.handleMarketData.bind(this));
+    this.socket.on("market-data-batch", this.handleMarketDataBatch.bind(this));
 
     this.socket.on("error", (error) => {
       console.error("❌ Market Data Service: WebSocket error:", error);
@@ -163,6 +165,18 @@ class MarketDataService {
     }
   }
 
+  // Batched frames carry the latest update per symbol as { symbol: data }
+  // for every symbol streamed by the server; keep only the ones we requested
+  handleMarketDataBatch(batch) {
+    if (!batch || typeof batch !== "object") return;
+
+    for (const [symbol, data] of Object.entries(batch)) {
+      if (this.requestedSymbols.has(symbol.toUpperCase())) {
+        this.handleMarketData(data);
+      }
+    }
+  }
+
   handleDisconnection() {
     // Implement exponential backoff for reconnection
     if (this.reconnectAttempts < CONFIG.MAX_RECONNECT_ATTEMPTS) {
@@ -218,6 +232,9 @@ class MarketDataService {
   requestSymbols(symbols = ["GOLD"]) {
     // Ensure symbols is an array
     const symbolsArray = Array.isArray(symbols) ? symbols : [symbols];
+    symbolsArray.forEach((symbol) =>
+      this.requestedSymbols.add(String(symbol).toUpperCase())
+    );
 
     if (this.socket && this.isConnected) {
       console.log(